@@ -18,6 +18,40 @@ __author__ = 'Vitaly R. Samigullin'
 __copyright__ = "Copyright 2016, Vitaly R. Samigullin"
 __status__ = 'Production'
 
+import numpy as np
+
+# error handling modes for batch methods
+RAISE, MASK = 'raise', 'mask'
+
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def exact_product(*factors):
+    """
+    Element-wise product of arrays (or scalars) matching Python's int math.
+
+    NumPy integers silently wrap around on overflow, while Python ints
+    don't. Integer factors are multiplied as int64 if the product of
+    their largest absolute values fits into it, and as Python ints
+    (object dtype) otherwise. Non-integer factors are multiplied as is.
+    """
+    arrays = [np.asarray(f) for f in factors]
+    if not all(a.dtype.kind in 'biu' for a in arrays):
+        result = arrays[0]
+        for a in arrays[1:]:
+            result = result * a
+        return result
+
+    bound = 1
+    for a in arrays:
+        if a.size:
+            bound *= max(abs(int(a.min())), abs(int(a.max())))
+    dtype = np.int64 if bound <= INT64_MAX else object
+    result = arrays[0].astype(dtype)
+    for a in arrays[1:]:
+        result = result * a.astype(dtype)
+    return result
+
 
 class MyError(Exception):
     """
@@ -28,13 +62,43 @@ class MyError(Exception):
     pass
 
 
+class GuardedAttribute(object):
+    """
+    A data descriptor that refuses to set a single forbidden value.
+
+    Only the guarded attribute pays for the check, all the other
+    attributes of the instance are set natively by the interpreter
+    (overriding __setattr__ would slow down each and every assignment).
+    The value itself is kept in a slot named after the attribute
+    with a leading underscore.
+    """
+
+    def __init__(self, name, forbidden):
+        self.name = name
+        self.slot = '_' + name
+        self.forbidden = forbidden
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.slot)
+
+    def __set__(self, obj, value):
+        # throw an exception if and only if
+        # we try to assign the forbidden value
+        if value == self.forbidden:
+            raise AttributeError(self.name)
+        setattr(obj, self.slot, value)
+
+
 class Parent(object):
     """
     A parent class the following classes derived from.
 
-    There's nothing to do in this class. Let's just pass it.
+    There's nothing to do in this class but declare empty __slots__,
+    so that the derived classes may get rid of instance's __dict__.
     """
-    pass
+    __slots__ = ()
 
 
 class First(Parent):
@@ -47,28 +111,25 @@ class First(Parent):
         super(Parent, self).__init__()
 
     But let's stick to a Python's concise and beautiful style and
-    just pass the body of the derived class
+    just pass the body of the derived class (empty __slots__ aside)
     """
-    pass
+    __slots__ = ()
 
 
 class Second(Parent):
-    pass
+    __slots__ = ()
 
 
 class A(First):
+    __slots__ = ('i', '_isSecond')
+
+    # assigning 2 to isSecond raises AttributeError
+    isSecond = GuardedAttribute('isSecond', 2)
+
     def __init__(self):
         self.i = 3
         self.isSecond = 0
 
-    def __setattr__(self, name, value):
-        # throw an exception if and only if
-        # we try to assign 2 to isSecond attribute
-        if name == 'isSecond' and value == 2:
-            raise AttributeError()
-        else:
-            object.__setattr__(self, name, value)
-
     def fnc(self, val):
         if val == 7:
             raise MyError('Error text')
@@ -79,6 +140,26 @@ class A(First):
             # considered a bad style of programming.
             return val * val * self.i
 
+    def fnc_batch(self, vals, errors=RAISE):
+        """
+        Vectorized fnc for a sequence or a NumPy array of values.
+
+        With errors='raise' MyError is thrown if any of the values is 7.
+        With errors='mask' a 2-tuple (result, mask) is returned instead,
+        where mask is a boolean array marking the offending positions
+        (result is still computed there, so ignore it or mask it out).
+        """
+        vals = np.asarray(vals)
+        mask = vals == 7
+        if errors == RAISE:
+            if mask.any():
+                raise MyError('Error text')
+            return exact_product(vals, vals, self.i)
+        elif errors == MASK:
+            return exact_product(vals, vals, self.i), mask
+        raise ValueError("errors must be either '{0}' or '{1}'".format(
+            RAISE, MASK))
+
     def isFirst(self):
         """
         isFirst breaks PEP8 naming conventions (this is not Java!),
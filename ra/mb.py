@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from ma import Second
+from ma import Second, exact_product
 
 """
 mb is a module for the interview test problem.
@@ -31,6 +31,8 @@ NOT_A_MAGIC_CONSTANT = 5
 
 
 class B(Second):
+    __slots__ = ('i', 'isSecond')
+
     def __init__(self, i):
         self.i = i
         self.isSecond = 1
@@ -38,5 +40,14 @@ class B(Second):
     def fnc(self, val1, val2):
         return val1 * val2 * NOT_A_MAGIC_CONSTANT
 
+    def fnc_batch(self, vals1, vals2):
+        """
+        Vectorized fnc for sequences or NumPy arrays of values.
+
+        Arguments are broadcast against each other, so either of them
+        may be a scalar.
+        """
+        return exact_product(vals1, vals2, NOT_A_MAGIC_CONSTANT)
+
     def isFirst(self):
         return 0
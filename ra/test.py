@@ -24,7 +24,7 @@ def test():
 
     try:
         a.fnc(7)
-    except MyError, v:
+    except MyError as v:
         if str(v) != "Error text":
             assert(0)
     else:
@@ -36,9 +36,50 @@ def test():
         pass
     else:
         assert(0)
+    assert(a.isSecond == 0)
+
+    a.isSecond = 1
+    assert(a.isSecond == 1)
+    assert(not hasattr(a, '__dict__'))
+    assert(not hasattr(b, '__dict__'))
+
+
+def test_fnc_batch():
+    a = A()
+    b = B(5)
+
+    assert(list(a.fnc_batch([1, 2, 3])) == [a.fnc(1), a.fnc(2), a.fnc(3)])
+    assert(list(b.fnc_batch([1, 2], [10, 4])) == [b.fnc(1, 10), b.fnc(2, 4)])
+    assert(list(b.fnc_batch([1, 2], 3)) == [b.fnc(1, 3), b.fnc(2, 3)])
+
+    try:
+        a.fnc_batch([1, 7, 3])
+    except MyError:
+        pass
+    else:
+        assert(0)
+
+    result, mask = a.fnc_batch([1, 7, 3, 7], errors=MASK)
+    assert(list(mask) == [False, True, False, True])
+    assert(result[0] == a.fnc(1) and result[2] == a.fnc(3))
+
+    # no silent int64 overflow, results match Python ints
+    big = 4 * 10 ** 9
+    assert(list(a.fnc_batch([big, -big])) == [a.fnc(big), a.fnc(-big)])
+    assert(list(b.fnc_batch([big], [big])) == [b.fnc(big, big)])
+    result, mask = a.fnc_batch([big, 7], errors=MASK)
+    assert(result[0] == a.fnc(big))
+
+    try:
+        a.fnc_batch([1], errors='ignore')
+    except ValueError:
+        pass
+    else:
+        assert(0)
 
 
 
 if __name__ == "__main__":
     test()
-    print "done"
+    test_fnc_batch()
+    print("done")
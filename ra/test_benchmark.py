@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the hot paths of ma and mb modules.
+
+Run with pytest-benchmark and save results as a JSON baseline:
+
+$ python3 -m pytest test_benchmark.py --benchmark-autosave
+
+Compare against the latest saved baseline, fail on regression:
+
+$ python3 -m pytest test_benchmark.py --benchmark-compare \
+      --benchmark-compare-fail=mean:10%
+"""
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from ma import A, MyError, MASK
+from mb import B
+
+VALUES = list(range(10000))
+
+
+def test_construct_a(benchmark):
+    benchmark(A)
+
+
+def test_construct_b(benchmark):
+    benchmark(B, 5)
+
+
+def test_setattr_plain(benchmark):
+    a = A()
+    benchmark(setattr, a, 'i', 5)
+
+
+def test_setattr_guarded(benchmark):
+    a = A()
+    benchmark(setattr, a, 'isSecond', 1)
+
+
+def test_setattr_guarded_rejected(benchmark):
+    a = A()
+
+    def set_forbidden():
+        try:
+            a.isSecond = 2
+        except AttributeError:
+            pass
+
+    benchmark(set_forbidden)
+
+
+def test_fnc_a(benchmark):
+    a = A()
+    assert benchmark(a.fnc, 2) == 12
+
+
+def test_fnc_b(benchmark):
+    b = B(5)
+    assert benchmark(b.fnc, 10, 4) == 200
+
+
+def test_fnc_error(benchmark):
+    a = A()
+
+    def fnc_seven():
+        try:
+            a.fnc(7)
+        except MyError:
+            pass
+
+    benchmark(fnc_seven)
+
+
+def test_fnc_loop_a(benchmark):
+    a = A()
+    benchmark(lambda: [a.fnc(v) for v in VALUES if v != 7])
+
+
+def test_fnc_batch_a(benchmark):
+    a = A()
+    benchmark(a.fnc_batch, VALUES, MASK)
+
+
+def test_fnc_batch_b(benchmark):
+    b = B(5)
+    benchmark(b.fnc_batch, VALUES, VALUES)
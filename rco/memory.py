@@ -0,0 +1,180 @@
+"""
+### Memory footprint ###
+
+sys.getsizeof reports the size of an object itself, not of the objects
+it refers to. deep_sizeof walks the references, counting every object once
+(shared objects, like Menu flyweights or repeated strings, are not counted
+twice), and skips classes, functions and modules, objects cached by the
+interpreter (None, booleans, small ints, empty tuple and so on), interned
+strings, as well as SQLAlchemy instance state (otherwise a loaded ORM object
+would drag its session and mappers into the count).
+
+MemoryUsage takes tracemalloc snapshots around a block of code or a function
+call and reports net allocations grouped by call site.
+
+See also:
+https://docs.python.org/3/library/tracemalloc.html
+https://docs.python.org/3/library/gc.html#gc.get_referents
+https://docs.python.org/3/library/sys.html#sys.intern
+"""
+import gc
+import sys
+import tracemalloc
+from collections import Counter
+from contextlib import ContextDecorator
+from types import BuiltinFunctionType, FrameType, FunctionType, MethodType, ModuleType
+
+# objects of these types are shared by the program, not owned by a structure
+SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, FrameType)
+
+try:
+    from sqlalchemy.orm.state import InstanceState
+except ImportError:
+    pass
+else:
+    SHARED_TYPES += (InstanceState,)
+
+# objects cached by CPython, a program never pays for them
+SHARED_OBJECTS = frozenset(id(o) for o in
+                           (None, True, False, Ellipsis, NotImplemented, (), '', b'')
+                           + tuple(range(-5, 257)))
+
+
+class MemoryBudgetError(Exception):
+    pass
+
+
+def is_interned(s):
+    """
+    Check if the string is interned, without interning it
+
+    sys.intern returns the interned string equal to its argument, if any,
+    so it's called on a fresh copy: the copy itself gets interned only
+    for as long as it lives.
+    :param s: str
+    :return: bool
+    """
+    if len(s) < 2:
+        # empty string and Latin-1 characters are cached by CPython
+        return not s or ord(s) < 256
+    return sys.intern(s[:1] + s[1:]) is s
+
+
+def walk(obj, ignore=()):
+    """
+    Yield obj and all objects reachable from it, each one once
+    :param obj: any object
+    :param ignore: tuple of extra types not to count and walk into
+    :return: generator of objects
+    """
+    ignore = SHARED_TYPES + tuple(ignore)
+    seen = set(SHARED_OBJECTS)
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, ignore):
+            continue
+        seen.add(id(o))
+        if type(o) is str and is_interned(o):
+            continue
+        yield o
+        stack.extend(gc.get_referents(o))
+
+
+def deep_sizeof(obj, ignore=()):
+    """
+    Return size of the object and all objects it refers to, in bytes
+
+    >>> deep_sizeof([1000, 1000]) == sys.getsizeof([1000, 1000]) + sys.getsizeof(1000)
+    True
+    :param obj: any object
+    :param ignore: tuple of extra types not to count
+    :return: int
+    """
+    return sum(map(sys.getsizeof, walk(obj, ignore)))
+
+
+def deep_sizeof_by_type(obj, ignore=()):
+    """
+    Return deep size of the object grouped by type name of referred objects
+    :param obj: any object
+    :param ignore: tuple of extra types not to count
+    :return: Counter of type name -> bytes
+    """
+    sizes = Counter()
+    for o in walk(obj, ignore):
+        sizes[type(o).__name__] += sys.getsizeof(o)
+    return sizes
+
+
+class MemoryUsage(ContextDecorator):
+    """
+    Context manager and decorator measuring memory allocated in a block
+
+    with MemoryUsage(budget=10 ** 6) as usage:
+        plan = generate_menu2(365)
+    print(usage.report())
+
+    Blocks may be nested, and a decorated function may call itself: every
+    entry keeps its own snapshot, the results are those of the last block
+    exited (the outermost call for a recursive function).
+
+    :param key_type: str, tracemalloc grouping: 'lineno', 'filename' or 'traceback'
+    :param budget: int, raise MemoryBudgetError if net allocation exceeds it, bytes
+    :param limit: int, number of call sites in the report
+    """
+    # peaks of all open blocks, tracemalloc has a single peak for the process,
+    # so an inner block saves it for the outer ones before resetting it
+    _open_peaks = []
+
+    def __init__(self, key_type='lineno', budget=None, limit=10):
+        self.key_type = key_type
+        self.budget = budget
+        self.limit = limit
+        self.stats = []
+        self.size_diff = 0
+        self.peak = 0
+        self._entries = []
+
+    def __enter__(self):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        peak = tracemalloc.get_traced_memory()[1]
+        open_peaks = MemoryUsage._open_peaks
+        open_peaks[:] = [max(p, peak) for p in open_peaks]
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        before_size = tracemalloc.get_traced_memory()[0]
+        self._entries.append((started, before, before_size, len(open_peaks)))
+        open_peaks.append(before_size)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        started, before, before_size, level = self._entries.pop()
+        peak = max(peak, MemoryUsage._open_peaks[level])
+        del MemoryUsage._open_peaks[level:]
+        if started:
+            tracemalloc.stop()
+        # don't count tracemalloc's and own allocations in the report
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, __file__)]
+        self.stats = after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), self.key_type)
+        self.size_diff = sum(stat.size_diff for stat in self.stats)
+        self.peak = peak - before_size
+
+        if exc_type is None and self.budget is not None and self.size_diff > self.budget:
+            raise MemoryBudgetError("Allocated {0} bytes over the budget of {1} bytes".format(
+                self.size_diff, self.budget))
+
+    def report(self):
+        """
+        Return human readable report on top allocating call sites
+        :return: str
+        """
+        lines = ["Allocated: {0} B, peak: {1} B".format(self.size_diff, self.peak)]
+        lines.extend(str(stat) for stat in self.stats[:self.limit])
+        return "\n".join(lines)
@@ -1,7 +1,9 @@
 # source:
 # http://stackoverflow.com/a/22357235/4241180
 
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import (create_engine, event, inspect, case, func, literal,
+                        select, union_all, Column, Integer, String, ForeignKey,
+                        Index, UniqueConstraint)
 from sqlalchemy.orm import relationship, scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -16,17 +18,244 @@ class User(Base):
     name = Column(String(50), nullable=False)
 
 
+# Direction matters for a Dialogue, but not for "who talks to whom" questions.
+# Conversation keeps an unordered pair of users as (low_id, high_id), so that
+# a pair lookup is a single probe of the unique index, and partners of a user
+# can be read from (low_id, high_id) and (high_id, low_id) indexes only.
+# Rows are maintained by the Dialogue mapper events below, don't touch them.
+class Conversation(Base):
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        UniqueConstraint('low_id', 'high_id'),
+        Index('ix_conversations_high_id_low_id', 'high_id', 'low_id'),
+    )
+    id = Column(Integer, primary_key=True)
+    low_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    high_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    dialogues_count = Column(Integer, nullable=False, default=0)
+
+
+# Dialogue counts per user, maintained by the Dialogue mapper events below
+# as well as Conversation, so that dashboards don't need GROUP BY over
+# the whole dialogues table. Use rebuild_aggregates to backfill.
+class UserActivity(Base):
+    __tablename__ = 'user_activity'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    sent_count = Column(Integer, nullable=False, default=0)
+    received_count = Column(Integer, nullable=False, default=0)
+
+
 class Dialogue(Base):
     __tablename__ = 'dialogues'
     id = Column(Integer, primary_key=True)
     receiver_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     sender_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), index=True)
     receiver = relationship("User", foreign_keys=[receiver_id])
     sender = relationship("User", foreign_keys=[sender_id])
+    conversation = relationship("Conversation")
+
+
+def user_pair(user1_id, user2_id):
+    """
+    Return ordered pair of user ids as stored in Conversation
+    :param user1_id: int
+    :param user2_id: int
+    :return: 2-tuple of ints (low_id, high_id)
+    """
+    if user1_id <= user2_id:
+        return user1_id, user2_id
+    return user2_id, user1_id
+
+
+def _attach_conversation(connection, dialogue):
+    low_id, high_id = user_pair(dialogue.sender_id, dialogue.receiver_id)
+    table = Conversation.__table__
+    row = connection.execute(
+        select(table.c.id).where((table.c.low_id == low_id) &
+                                 (table.c.high_id == high_id))).first()
+    if row is None:
+        result = connection.execute(
+            table.insert().values(low_id=low_id, high_id=high_id,
+                                  dialogues_count=1))
+        dialogue.conversation_id = result.inserted_primary_key[0]
+    else:
+        connection.execute(
+            table.update().where(table.c.id == row.id).values(
+                dialogues_count=table.c.dialogues_count + 1))
+        dialogue.conversation_id = row.id
+
+
+def _detach_conversation(connection, conversation_id):
+    table = Conversation.__table__
+    connection.execute(
+        table.update().where(table.c.id == conversation_id).values(
+            dialogues_count=table.c.dialogues_count - 1))
+    connection.execute(
+        table.delete().where((table.c.id == conversation_id) &
+                             (table.c.dialogues_count <= 0)))
+
+
+def _count_activity(connection, user_id, column, delta):
+    table = UserActivity.__table__
+    result = connection.execute(
+        table.update().where(table.c.user_id == user_id).values(
+            {column: table.c[column] + delta}))
+    if result.rowcount == 0:
+        values = {'user_id': user_id, 'sent_count': 0, 'received_count': 0}
+        values[column] = delta
+        connection.execute(table.insert().values(values))
+
+
+def _count_dialogue(connection, sender_id, receiver_id, delta):
+    _count_activity(connection, sender_id, 'sent_count', delta)
+    _count_activity(connection, receiver_id, 'received_count', delta)
+
+
+@event.listens_for(Dialogue, 'before_insert')
+def dialogue_before_insert(mapper, connection, target):
+    _attach_conversation(connection, target)
+    _count_dialogue(connection, target.sender_id, target.receiver_id, 1)
+
+
+def _old_value(connection, target, name):
+    history = getattr(inspect(target).attrs, name).history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # the old value was never loaded (e.g. the attribute was expired),
+    # the row is not updated yet, so it still keeps the value
+    table = Dialogue.__table__
+    return connection.execute(
+        select(table.c[name]).where(table.c.id == target.id)).scalar()
+
+
+@event.listens_for(Dialogue, 'before_update')
+def dialogue_before_update(mapper, connection, target):
+    state = inspect(target)
+    if not (state.attrs.sender_id.history.has_changes() or
+            state.attrs.receiver_id.history.has_changes()):
+        return
+    old_sender_id = _old_value(connection, target, 'sender_id')
+    old_receiver_id = _old_value(connection, target, 'receiver_id')
+    if (old_sender_id, old_receiver_id) == (target.sender_id,
+                                            target.receiver_id):
+        return
+    old_conversation_id = target.conversation_id
+    _attach_conversation(connection, target)
+    if old_conversation_id is not None:
+        _detach_conversation(connection, old_conversation_id)
+    _count_dialogue(connection, old_sender_id, old_receiver_id, -1)
+    _count_dialogue(connection, target.sender_id, target.receiver_id, 1)
+
+
+@event.listens_for(Dialogue, 'after_delete')
+def dialogue_after_delete(mapper, connection, target):
+    if target.conversation_id is not None:
+        _detach_conversation(connection, target.conversation_id)
+    _count_dialogue(connection, target.sender_id, target.receiver_id, -1)
+
+
+def rebuild_aggregates(session=session):
+    """
+    Recompute Conversation and UserActivity tables from scratch
+
+    Use to backfill aggregates for dialogues inserted bypassing the ORM
+    (e.g. with bulk Core inserts), mapper events don't fire then.
+    :param session: SQLAlchemy session
+    :return: None
+    """
+    dialogues = Dialogue.__table__
+    conversations = Conversation.__table__
+    activity = UserActivity.__table__
+    connection = session.connection()
+
+    connection.execute(dialogues.update().values(conversation_id=None))
+    connection.execute(conversations.delete())
+    connection.execute(activity.delete())
+
+    low = case((dialogues.c.sender_id <= dialogues.c.receiver_id,
+                dialogues.c.sender_id), else_=dialogues.c.receiver_id)
+    high = case((dialogues.c.sender_id <= dialogues.c.receiver_id,
+                 dialogues.c.receiver_id), else_=dialogues.c.sender_id)
+    connection.execute(conversations.insert().from_select(
+        ['low_id', 'high_id', 'dialogues_count'],
+        select(low, high, func.count()).group_by(low, high)))
+    connection.execute(dialogues.update().values(conversation_id=select(
+        conversations.c.id).where((conversations.c.low_id == low) &
+                                  (conversations.c.high_id == high))
+        .scalar_subquery()))
+
+    counts = union_all(
+        select(dialogues.c.sender_id.label('user_id'),
+               func.count().label('sent'), literal(0).label('received'))
+        .group_by(dialogues.c.sender_id),
+        select(dialogues.c.receiver_id, literal(0), func.count())
+        .group_by(dialogues.c.receiver_id)).subquery()
+    connection.execute(activity.insert().from_select(
+        ['user_id', 'sent_count', 'received_count'],
+        select(counts.c.user_id, func.sum(counts.c.sent),
+               func.sum(counts.c.received)).group_by(counts.c.user_id)))
+    session.commit()
+
+
+def activity(user, session=session):
+    """
+    Return number of dialogues the user sent and received
+    :param user: User
+    :param session: SQLAlchemy session
+    :return: 2-tuple of ints (sent, received)
+    """
+    row = session.query(UserActivity.sent_count,
+                        UserActivity.received_count).filter(
+        UserActivity.user_id == user.id).first()
+    return tuple(row) if row else (0, 0)
+
+
+def top_partners(user, limit=5, session=session):
+    """
+    Query users the user had most dialogues with
+    :param user: User
+    :param limit: int, number of partners
+    :param session: SQLAlchemy session
+    :return: Query of 2-tuples (user id, number of dialogues)
+    """
+    partner = case((Conversation.low_id == user.id, Conversation.high_id),
+                   else_=Conversation.low_id)
+    return session.query(partner, Conversation.dialogues_count).filter(
+        (Conversation.low_id == user.id) | (Conversation.high_id == user.id)
+    ).order_by(Conversation.dialogues_count.desc(), partner).limit(limit)
+
+
+def dialogues_between(user1, user2, session=session):
+    """
+    Query all dialogues between two users regardless of the direction
+    :param user1: User
+    :param user2: User
+    :param session: SQLAlchemy session
+    :return: Query of Dialogue
+    """
+    low_id, high_id = user_pair(user1.id, user2.id)
+    return session.query(Dialogue).join(Conversation).filter(
+        Conversation.low_id == low_id, Conversation.high_id == high_id)
+
+
+def partners(user, session=session):
+    """
+    Query ids of all users the user had dialogues with
+    :param user: User
+    :param session: SQLAlchemy session
+    :return: Query of 1-tuples of user id
+    """
+    return session.query(Conversation.high_id).filter(
+        Conversation.low_id == user.id).union(
+        session.query(Conversation.low_id).filter(
+            Conversation.high_id == user.id))
 
 Base.metadata.create_all(engine)
 
 # filtering with logical OR
 # http://stackoverflow.com/q/7942547/4241180
 
-# session.query(Dialogue).filter((Dialogue.sender==u1) | (Dialogue.receiver==u1)).all()
\ No newline at end of file
+# session.query(Dialogue).filter((Dialogue.sender==u1) | (Dialogue.receiver==u1)).all()
@@ -1,6 +1,12 @@
-import random
-import logging
-import urllib.request
+# Heavy modules (random, logging, urllib.request) are imported where they are
+# used, and demo objects (nt1, MyClass, mc1, EnoughDocs) are created on first
+# access via module __getattr__, so that importing questions stays cheap.
+import os
+import sys
+from array import array
+from functools import update_wrapper, wraps
+from itertools import compress, repeat
+from operator import eq, gt, and_
 from contextlib import ContextDecorator, contextmanager
 from time import time
 
@@ -15,6 +21,107 @@ def fun(x, l=[]):
         l.append(i)
     return l
 
+
+"""
+Default list above is created once and shared across the calls, so it
+grows without bound. Use an explicit accumulator instead: it is backed by
+a preallocated array of a fixed capacity and either refuses to overflow or,
+in ring mode, keeps only the most recent values.
+"""
+
+
+class Accumulator(object):
+    def __init__(self, capacity, ring=False, typecode='q'):
+        if capacity <= 0:
+            raise ValueError("Capacity must be a natural number")
+        self.capacity = capacity
+        self.ring = ring
+        self._buf = array(typecode, [0]) * capacity
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __repr__(self):
+        return "Accumulator({0})".format(self.tolist())
+
+    def tolist(self):
+        end = self._start + self._len
+        if end <= self.capacity:
+            return self._buf[self._start:end].tolist()
+        return (self._buf[self._start:] +
+                self._buf[:end - self.capacity]).tolist()
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+
+    def _check_free(self, n):
+        if n > self.capacity - self._len:
+            raise OverflowError("Accumulator capacity exceeded")
+
+    def append(self, value):
+        self.extend((value,))
+
+    def extend(self, values):
+        """
+        Add values in bulk, e.g. extend(range(x))
+
+        :param values: iterable of ints
+        :return: None
+        """
+        if self.ring and isinstance(values, range):
+            # slicing a range is O(1), skip values to be overwritten anyway
+            values = values[-self.capacity:]
+        if not self.ring and hasattr(values, '__len__'):
+            # fail before copying an oversized range, list or array
+            self._check_free(len(values))
+        if not isinstance(values, array):
+            # fromlist is considerably faster than array(typecode, iterable)
+            values_list, values = values, array(self._buf.typecode)
+            values.fromlist(list(values_list))
+        n = len(values)
+        free = self.capacity - self._len
+        if not self.ring:
+            self._check_free(n)
+
+        if n >= self.capacity:
+            # only the tail of values survives in the ring
+            self._buf[:] = values[n - self.capacity:]
+            self._start = 0
+            self._len = self.capacity
+            return
+
+        end = (self._start + self._len) % self.capacity
+        head = min(n, self.capacity - end)
+        self._buf[end:end + head] = values[:head]
+        self._buf[:n - head] = values[head:]
+
+        if n > free:
+            # overwritten the oldest values
+            self._start = (self._start + n - free) % self.capacity
+            self._len = self.capacity
+        else:
+            self._len += n
+
+
+def accumulate(x, acc=None):
+    """
+    Copy-safe counterpart of fun
+
+    :param x: int, number of values range(x) to add
+    :param acc: Accumulator, new one of capacity x is created if omitted
+    :return: Accumulator
+    """
+    if acc is None:
+        acc = Accumulator(max(x, 1))
+    acc.extend(range(x))
+    return acc
+
 """
 ### Class-based decorators
 """
@@ -31,6 +138,7 @@ class DecoratorClass(object):
         self.kwargs = kwargs
 
     def __call__(self, f):
+        @wraps(f)
         def wrap(*args, **kwargs):
             result = f(*args, **kwargs)
             if result < 0:
@@ -48,16 +156,108 @@ https://www.oreilly.com/ideas/5-reasons-you-need-to-learn-to-write-python-decora
 http://blog.thedigitalcatonline.com/blog/2015/04/23/python-decorators-metaprogramming-with-style/
 """
 
+def check_natural_number(x):
+    if not (type(x) == int and x > 0):
+        raise ValueError("Argument is not a natural number")
+
+
+def clamp_non_negative(result):
+    # NumPy arrays get clamped element-wise with no Python loop
+    if getattr(result, 'ndim', 0):
+        return result.clip(min=0)
+    if result <= 0:
+        return 0
+    else:
+        return result
+
+
 def test_argument_is_natural_number(func):
+    @wraps(func)
     def wrapper(x):
-        if type(x) == int and x > 0:
-            return func(x)
-        else:
-            raise ValueError("Argument is not a natural number")
+        check_natural_number(x)
+        return func(x)
+    return wrapper
+
+
+def make_non_negative(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return clamp_non_negative(func(*args, **kwargs))
     return wrapper
 
 
-@test_argument_is_natural_number
+"""
+### Fused decorators ###
+
+Each decorator in a stack adds a Python frame with its own argument packing,
+and a recursive function pays for all of the checks on every step.
+fused generates a single wrapper with the exact positional signature of
+the function, calling pre-checks on the arguments and post-checks on the
+result. Checks are skipped in recursive calls, i.e. when the wrapper is
+called right from the wrapped function itself (the caller's frame tells it,
+so calls from other threads or callbacks are always checked), and in
+trusted mode. Trusted mode is on when TRUSTED_MODE is true; it's read on
+every call, so it may be switched at run time. QUESTIONS_TRUSTED
+environment variable set to a non-empty value turns it on at import, and
+then fused doesn't wrap functions at all (nor can they be checked later).
+
+https://docs.python.org/3/library/functools.html#functools.update_wrapper
+https://docs.python.org/3/library/sys.html#sys._getframe
+"""
+
+TRUSTED_MODE = bool(os.environ.get('QUESTIONS_TRUSTED'))
+
+# co_flags for *args and **kwargs
+CO_VARARGS, CO_VARKEYWORDS = 0x04, 0x08
+
+FUSED_TEMPLATE = """
+def wrapper({params}):
+    if _getframe(1).f_code is _code or _globals['TRUSTED_MODE']:
+        return _func({params})
+{pre}    result = _func({params})
+{post}    return result
+"""
+
+
+def fused(pre=(), post=()):
+    """
+    Decorator factory fusing pre-checks and post-checks into one wrapper
+
+    :param pre: iterable of callables taking function's arguments,
+                raise an exception if arguments are invalid
+    :param post: iterable of callables taking function's result,
+                 return result (possibly changed) or raise an exception
+    :return: decorator
+    """
+    pre, post = tuple(pre), tuple(post)
+
+    def decorator(func):
+        if TRUSTED_MODE:
+            return func
+        code = func.__code__
+        if (func.__defaults__ or code.co_kwonlyargcount or
+                code.co_flags & (CO_VARARGS | CO_VARKEYWORDS)):
+            params = '*args, **kwargs'
+        else:
+            params = ', '.join(code.co_varnames[:code.co_argcount])
+
+        namespace = {'_func': func, '_code': code, '_getframe': sys._getframe,
+                     '_globals': globals()}
+        namespace.update(('_pre{0}'.format(i), f) for i, f in enumerate(pre))
+        namespace.update(('_post{0}'.format(i), f) for i, f in enumerate(post))
+        source = FUSED_TEMPLATE.format(
+            params=params,
+            pre=''.join('    _pre{0}({1})\n'.format(i, params)
+                        for i in range(len(pre))),
+            post=''.join('    result = _post{0}(result)\n'.format(i)
+                         for i in range(len(post))))
+        exec(source, namespace)
+        return update_wrapper(namespace['wrapper'], func)
+
+    return decorator
+
+
+@fused(pre=(check_natural_number,))
 def factorial(n):
     if n == 1:
         return 1
@@ -65,23 +265,30 @@ def factorial(n):
         return n * factorial(n - 1)
 
 
-def make_non_negative(func):
-    def wrapper(x):
-        result = func(x)
-        if result <= 0:
-            return 0
-        else:
-            return result
-    return wrapper
-
 @make_non_negative
 def negative_range(n):
+    import random
     return random.randrange(-n, n)
 
 
+@make_non_negative
+def negative_range_batch(n, count, seed=None):
+    """
+    Batch counterpart of negative_range drawing all the values at once
+    :param n: int
+    :param count: int, number of values
+    :param seed: int or numpy.random.Generator, fresh entropy if None
+    :return: numpy array of ints in [0, n)
+    """
+    import numpy as np
+    return np.random.default_rng(seed).integers(-n, n, size=count)
+
+
 # logging decorator
 def log_it(func):
+    @wraps(func)
     def wrapper(*args, **kwargs):
+        import logging
         logging.warning('{0} function has been called.'.format(func.__name__))
         result = func(*args, **kwargs)
         logging.warning('Function returned: {0}.'.format(result))
@@ -212,12 +419,15 @@ class NewTestCls(TestCls):
     def __repr__(self):
         return "NewTestCls({0})".format(self.s.upper())
 
-nt1 = NewTestCls.alt_constr(['hello', 'world'])
+def _make_nt1():
+    return NewTestCls.alt_constr(['hello', 'world'])
 
 # yet another example of using class method for alternative constructor
 # http://stackoverflow.com/a/12179752/4241180
 
 class NewDate(object):
+    __slots__ = ('day', 'month', 'year')
+
     def __init__(self, day=0, month=0, year=0):
         self.day = day
         self.month = month
@@ -231,6 +441,111 @@ class NewDate(object):
         new_date = cls(day, month, year)
         return new_date
 
+    @classmethod
+    def from_strings(cls, dates_as_strings):
+        """
+        Alternative bulk constructor, see DateColumns.from_bytes
+        :param dates_as_strings: iterable of 'd-m-y' strings
+        :return: DateColumns
+        """
+        return DateColumns.from_bytes('\n'.join(dates_as_strings), cls)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Alternative bulk constructor for a file of whitespace separated dates
+        :param path: str, file path
+        :return: DateColumns
+        """
+        with open(path, 'rb') as f:
+            return DateColumns.from_bytes(f.read(), cls)
+
+
+# maximum number of days in a month, February 29 is checked separately
+MONTH_DAYS = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+class DateColumns(object):
+    """
+    Dates stored column-wise as three compact integer arrays.
+
+    NewDate objects are created on demand only, when indexing or iterating.
+    """
+    def __init__(self, day, month, year, date_class=NewDate):
+        self.day = day
+        self.month = month
+        self.year = year
+        self.date_class = date_class
+
+    @classmethod
+    def from_bytes(cls, data, date_class=NewDate):
+        """
+        Parse whitespace separated 'd-m-y' dates from bytes (or str) buffer
+
+        Parsing and validation loops run in C: the buffer is split into
+        records on whitespace, and records are joined with ' ' tokens in
+        between and split on dashes at once, so every date must give
+        exactly 3 tokens before a ' ' one. int rejects anything but digits,
+        except for signs, underscores and non-ASCII digits looked up first.
+        Ranges are checked with map over columns.
+        :param data: bytes or str
+        :param date_class: class to create dates with
+        :return: DateColumns
+        """
+        if isinstance(data, str):
+            dash, space, plus, underscore = '-', ' ', '+', '_'
+        else:
+            dash, space, plus, underscore = b'-', b' ', b'+', b'_'
+        records = data.split()
+        tokens = (dash + space + dash).join(records).split(dash)
+        if records and (len(tokens) != 4 * len(records) - 1 or
+                        tokens[3::4].count(space) != len(records) - 1 or
+                        not data.isascii() or plus in data or underscore in data):
+            raise ValueError("Dates must be in 'd-m-y' format")
+        day, month, year = array('B'), array('B'), array('l')
+        try:
+            # fromlist is considerably faster than array(typecode, iterable)
+            day.fromlist(list(map(int, tokens[0::4])))
+            month.fromlist(list(map(int, tokens[1::4])))
+            year.fromlist(list(map(int, tokens[2::4])))
+        except OverflowError:
+            raise ValueError("Invalid date in the input")
+        except ValueError:
+            # empty or non-digit token, e.g. '1--2016'
+            raise ValueError("Dates must be in 'd-m-y' format")
+        columns = cls(day, month, year, date_class)
+        columns.validate()
+        return columns
+
+    def validate(self):
+        """
+        Raise ValueError if any of dates is out of range
+        :return: None
+        """
+        day, month, year = self.day, self.month, self.year
+        if not day:
+            return
+        valid = (min(year) >= 1 and min(month) >= 1 and max(month) <= 12 and
+                 min(day) >= 1 and
+                 not any(map(gt, day, map(MONTH_DAYS.__getitem__, month))))
+        if valid and 29 in day:
+            # February 29 in non-leap years
+            feb29 = compress(year, map(and_, map(eq, month, repeat(2)),
+                                       map(eq, day, repeat(29))))
+            valid = all(y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)
+                        for y in feb29)
+        if not valid:
+            raise ValueError("Invalid date in the input")
+
+    def __len__(self):
+        return len(self.day)
+
+    def __getitem__(self, i):
+        return self.date_class(self.day[i], self.month[i], self.year[i])
+
+    def __iter__(self):
+        return map(self.date_class, self.day, self.month, self.year)
+
 """
 ### Metaclass ###
 
@@ -238,6 +553,11 @@ The most comprehensive practical tutorial on metaclass:
 http://stackoverflow.com/a/6581949/4241180
 """
 
+# Class creation checks below are skipped under python -O or when
+# QUESTIONS_SKIP_VALIDATION environment variable is set to a non-empty value
+VALIDATE_CLASSES = __debug__ and not os.environ.get('QUESTIONS_SKIP_VALIDATION')
+
+
 # first metaclass
 class UpperAttrMetaclass(type):
     """
@@ -246,13 +566,8 @@ class UpperAttrMetaclass(type):
     Makes sure all attributes are uppercased.
     """
     def __new__(cls, clsname, bases, dct):
-        uppercase_attr = {}
-
-        for name, value in dct.items():
-            if not name.startswith('__'):
-                uppercase_attr[name.upper()] = value
-            else:
-                uppercase_attr[name] = value
+        uppercase_attr = {name if name.startswith('__') else name.upper(): value
+                          for name, value in dct.items()}
 
         return super(UpperAttrMetaclass, cls).__new__(cls, clsname, bases, uppercase_attr)
 
@@ -265,10 +580,14 @@ def useless_method(self):
     """
     return self.X, self.Y
 
-MyClass = UpperAttrMetaclass('UpperAttrMetaclass', (),
-                             {'x': 1, 'y': 2, 'useless_method': useless_method})
+def _make_my_class():
+    return UpperAttrMetaclass('UpperAttrMetaclass', (),
+                              {'x': 1, 'y': 2, 'useless_method': useless_method})
 
-mc1 = MyClass()
+
+def _make_mc1():
+    # attribute access on the module reuses MyClass if it's created already
+    return getattr(sys.modules[__name__], 'MyClass')()
 
 
 # yet another metaclass
@@ -279,52 +598,58 @@ class DocStrMeta(type):
     Makes sure all methods (except for private and non-callable ones) have docstring.
     """
     def __init__(self, name, bases, attrs):
-        nodocs = []
-        for key, value in attrs.items():
-            # skip special and private methods
-            if key.startswith("__"): continue
-            # skip any non-callable
-            if not hasattr(value, "__call__"): continue
-            # check for a doc string. a better way may be to store
-            # all methods without a docstring then throw an error showing
-            # all of them rather than stopping on first encounter
-            if not getattr(value, '__doc__'):
-                nodocs.append(key)
-                #raise TypeError("%s must have a docstring" % key)
-
-        if nodocs:
-            methods_without_docstr = ", ".join(nodocs)
-            raise TypeError("Methods {0} have no docstring!".format(methods_without_docstr))
+        if VALIDATE_CLASSES:
+            nodocs = []
+            for key, value in attrs.items():
+                # skip special and private methods
+                if key.startswith("__"): continue
+                # skip any non-callable
+                if not hasattr(value, "__call__"): continue
+                # check for a doc string. a better way may be to store
+                # all methods without a docstring then throw an error showing
+                # all of them rather than stopping on first encounter
+                if not getattr(value, '__doc__'):
+                    nodocs.append(key)
+                    #raise TypeError("%s must have a docstring" % key)
+
+            if nodocs:
+                methods_without_docstr = ", ".join(nodocs)
+                raise TypeError("Methods {0} have no docstring!".format(methods_without_docstr))
 
         type.__init__(self, name, bases, attrs)
 
 
-class EnoughDocs(object, metaclass=DocStrMeta):
-    # __metaclass__ field used in Python 2.x. but disallowed in Python 3.x
-    # use keyword argument metaclass for a class instead
-    #__metaclass__ = DocStrMeta
+def _make_enough_docs():
+    class EnoughDocs(object, metaclass=DocStrMeta):
+        # __metaclass__ field used in Python 2.x. but disallowed in Python 3.x
+        # use keyword argument metaclass for a class instead
+        #__metaclass__ = DocStrMeta
 
-    def __init__(self, a, b, c):
-        self.a = a
-        self.b = b
-        self.c = c
+        def __init__(self, a, b, c):
+            self.a = a
+            self.b = b
+            self.c = c
 
-    def geta(self):
-        """
-        Get the a!
+        def geta(self):
+            """
+            Get the a!
 
-        Once removed this docstring, Python will throw a TypeError, because parent class requires docstrings!
-        :return: int (constant)
-        """
-        return self.a
+            Once removed this docstring, Python will throw a TypeError, because parent class requires docstrings!
+            :return: int (constant)
+            """
+            return self.a
 
-    def seta(self, newa):
-        """
-        Set the a!
-        :param newa:
-        :return:
-        """
-        self.a = newa
+        def seta(self, newa):
+            """
+            Set the a!
+            :param newa:
+            :return:
+            """
+            self.a = newa
+
+    # make the class reachable as questions.EnoughDocs, e.g. for pickle
+    EnoughDocs.__qualname__ = 'EnoughDocs'
+    return EnoughDocs
 
 """
 class NotEnoughDocs(object, metaclass=DocStrMeta):
@@ -380,6 +705,7 @@ class UrlRetriever():
         self.url = url
 
     def __enter__(self):
+        import urllib.request
         self.local_filename, self.headers = urllib.request.urlretrieve(self.url)
         self.response = open(self.local_filename)
         return self.response
@@ -397,6 +723,7 @@ https://gist.github.com/bradmontgomery/4f4934893388f971c6c5
 
 @contextmanager
 def opener(url='http://www.python.org'):
+    import urllib.request
     print('Start')
     yield urllib.request.urlopen(url)
     print('Stop')
@@ -414,3 +741,30 @@ class TimeElapsed(ContextDecorator):
         print("Stop time: {0}".format(self.stop))
         print("Time elapsed: {0}".format(elapsed))
 
+
+"""
+### Lazy module attributes
+See PEP 562:
+https://www.python.org/dev/peps/pep-0562/
+"""
+
+_LAZY_ATTRIBUTES = {
+    'nt1': _make_nt1,
+    'MyClass': _make_my_class,
+    'mc1': _make_mc1,
+    'EnoughDocs': _make_enough_docs,
+}
+
+
+def __getattr__(name):
+    """
+    Create demo object on first access and cache it in module globals
+    :param name: str, attribute name
+    :return: demo object
+    """
+    try:
+        factory = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = globals()[name] = factory()
+    return value
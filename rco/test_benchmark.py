@@ -0,0 +1,71 @@
+"""
+Benchmarks for dialogue aggregates on a local SQLite database.
+
+Dialogues are bulk inserted with Core (mapper events don't fire),
+then aggregates are backfilled with rebuild_aggregates. Number of
+dialogues is set with BENCHMARK_DIALOGUES environment variable; it's
+small by default, to keep the test suite fast. For the real numbers:
+
+$ BENCHMARK_DIALOGUES=1000000 python3 -m pytest test_benchmark.py --benchmark-autosave
+"""
+import os
+import random
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, Dialogue, activity, top_partners, rebuild_aggregates
+
+DIALOGUES = int(os.environ.get('BENCHMARK_DIALOGUES', 10 ** 4))
+USERS = 1000
+
+
+@pytest.fixture(scope='module')
+def db_session(tmp_path_factory):
+    path = tmp_path_factory.mktemp('db') / 'dialogues.sqlite'
+    engine = create_engine('sqlite:///{0}'.format(path))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    rng = random.Random(0)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(),
+                           [{'id': i, 'name': str(i)} for i in range(1, USERS + 1)])
+        connection.execute(Dialogue.__table__.insert(),
+                           [{'sender_id': rng.randint(1, USERS),
+                             'receiver_id': rng.randint(1, USERS)}
+                            for _ in range(DIALOGUES)])
+    rebuild_aggregates(session)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture(scope='module')
+def user(db_session):
+    return db_session.get(User, 1)
+
+
+def test_activity(benchmark, db_session, user):
+    benchmark(activity, user, db_session)
+
+
+def test_activity_group_by(benchmark, db_session, user):
+    def count():
+        sent = db_session.query(func.count()).filter(Dialogue.sender_id == user.id).scalar()
+        received = db_session.query(func.count()).filter(Dialogue.receiver_id == user.id).scalar()
+        return sent, received
+
+    assert benchmark(count) == activity(user, db_session)
+
+
+def test_top_partners(benchmark, db_session, user):
+    benchmark(lambda: top_partners(user, session=db_session).all())
+
+
+def test_rebuild_aggregates(benchmark, db_session):
+    benchmark.pedantic(rebuild_aggregates, args=(db_session,), rounds=1)
@@ -1,12 +1,21 @@
+import os
+import pickle
+import subprocess
+import threading
 import unittest
 import sys
 from contextlib import contextmanager
 from io import StringIO
 from time import sleep
 
+import memory
 import questions as q
 from models import *
 
+# import of questions module must not take longer, microseconds
+IMPORT_TIME_BUDGET = 30000
+
+
 # Helper functions
 @contextmanager
 def captured_output():
@@ -33,6 +42,30 @@ def captured_output():
 
 # Test cases
 class InterviewTestCase(unittest.TestCase):
+    def test_import_time(self):
+        """
+        python -X importtime reports self and cumulative import time
+        for each imported module to stderr:
+
+        import time: self [us] | cumulative | imported package
+
+        https://docs.python.org/3/using/cmdline.html#cmdoption-X
+        :return:
+        """
+        code = "import sys, questions; print(','.join(sorted(sys.modules)))"
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, check=True)
+        modules = result.stdout.strip().split(',')
+        self.assertNotIn('urllib.request', modules)
+        self.assertNotIn('logging', modules)
+
+        timings = [line.split('|') for line in result.stderr.splitlines()
+                   if line.startswith('import time:')]
+        cumulative = {name.strip(): int(total) for _, total, name in timings[1:]}
+        self.assertLess(cumulative['questions'], IMPORT_TIME_BUDGET)
+
     def test_getsizeof(self):
         """
         Python docs:
@@ -61,6 +94,70 @@ class InterviewTestCase(unittest.TestCase):
         # bigger memory footprint.
         self.assertLess(sys.getsizeof(list()), sys.getsizeof(set()))
 
+    def test_deep_sizeof(self):
+        """
+        See discussion in memory.py
+        """
+        big = 10 ** 10
+        self.assertEqual(memory.deep_sizeof([big, big]),
+                         sys.getsizeof([big, big]) + sys.getsizeof(big))
+        # interpreter caches small ints, they are not counted
+        self.assertEqual(memory.deep_sizeof([1, 2]), sys.getsizeof([1, 2]))
+
+        fact = q.Factorial()
+        fact(100)
+        size = memory.deep_sizeof(fact)
+        self.assertGreater(size, sys.getsizeof(fact.cache))
+        self.assertEqual(sum(memory.deep_sizeof_by_type(fact).values()), size)
+        self.assertIn('dict', memory.deep_sizeof_by_type(fact))
+
+        # classes and functions are shared, not owned by the object
+        self.assertEqual(memory.deep_sizeof(q.TestCls), 0)
+
+        # interned strings are shared, non-interned ones are owned
+        word = ''.join(['chick', 'en'])
+        self.assertEqual(memory.deep_sizeof(['chicken']), sys.getsizeof(['chicken']))
+        self.assertEqual(memory.deep_sizeof([word]), sys.getsizeof([word]) + sys.getsizeof(word))
+        self.assertFalse(memory.is_interned(word))
+
+    def test_memory_usage(self):
+        with memory.MemoryUsage() as usage:
+            data = [str(i) for i in range(10000)]
+
+        self.assertGreater(usage.size_diff, sys.getsizeof(data))
+        self.assertGreaterEqual(usage.peak, usage.size_diff)
+        self.assertIn(__file__, usage.report())
+
+        with self.assertRaises(memory.MemoryBudgetError):
+            with memory.MemoryUsage(budget=1000):
+                data = [str(i) for i in range(10000)]
+
+        @memory.MemoryUsage(budget=10 ** 6)
+        def small():
+            return list(range(10))
+
+        self.assertEqual(small(), list(range(10)))
+
+        # nested blocks: the inner one doesn't wipe the peak of the outer one
+        with memory.MemoryUsage() as outer:
+            data = [str(i) for i in range(10000)]
+            del data
+            with memory.MemoryUsage() as inner:
+                pass
+        self.assertGreater(outer.peak, inner.peak)
+        self.assertGreater(outer.peak, 10000 * sys.getsizeof('1000'))
+
+        # decorated recursive function, results are of the outermost call
+        usage = memory.MemoryUsage()
+
+        @usage
+        def countdown(n):
+            return [str(n)] + countdown(n - 1) if n else []
+
+        self.assertEqual(len(countdown(100)), 100)
+        self.assertGreater(usage.size_diff, 0)
+        self.assertFalse(usage._entries)
+
     def test_hash(self):
         """
         Python docs:
@@ -104,6 +201,44 @@ class InterviewTestCase(unittest.TestCase):
         result3 = q.fun(5)
         self.assertEqual(result3, [0, 1, 2, 0, 1, 2, 3, 4])
 
+    def test_accumulator(self):
+        """
+        See discussion in question.py
+        """
+        # no state shared between the calls
+        self.assertEqual(q.accumulate(3).tolist(), [0, 1, 2])
+        self.assertEqual(q.accumulate(3).tolist(), [0, 1, 2])
+
+        acc = q.accumulate(2, q.Accumulator(4))
+        self.assertEqual(list(q.accumulate(2, acc)), [0, 1, 0, 1])
+        with self.assertRaises(OverflowError):
+            acc.append(2)
+        self.assertEqual(len(acc), 4)
+
+        # sized input is checked before it's copied
+        class Sized(object):
+            def __len__(self):
+                return 10 ** 7
+
+            def __iter__(self):
+                raise AssertionError("Oversized input must not be copied")
+
+        acc = q.Accumulator(3)
+        with self.assertRaises(OverflowError):
+            acc.extend(Sized())
+        with self.assertRaises(OverflowError):
+            acc.extend(x for x in range(4))
+        self.assertEqual(len(acc), 0)
+
+        ring = q.Accumulator(4, ring=True)
+        q.accumulate(3, ring)
+        q.accumulate(3, ring)
+        self.assertEqual(ring.tolist(), [2, 0, 1, 2])
+        ring.extend(range(10))
+        self.assertEqual(ring.tolist(), [6, 7, 8, 9])
+        ring.append(10)
+        self.assertEqual(ring.tolist(), [7, 8, 9, 10])
+
     def test_id_is(self):
         """
         id() returns the identity of an object. This is an integer (or long integer) which is
@@ -177,6 +312,46 @@ class InterviewTestCase(unittest.TestCase):
         self.assertEqual(date1.month, date2.month)
         self.assertEqual(date1.year, date2.year)
 
+    def test_bulk_alternative_constructor(self):
+        """
+        See discussion in question.py
+        """
+        dates = q.NewDate.from_strings(['11-10-2016', '29-2-2016', '1-1-1970'])
+        self.assertEqual(len(dates), 3)
+        self.assertEqual(list(dates.day), [11, 29, 1])
+        self.assertEqual(list(dates.month), [10, 2, 1])
+        self.assertEqual(list(dates.year), [2016, 2016, 1970])
+
+        date = dates[1]
+        self.assertIsInstance(date, q.NewDate)
+        self.assertEqual((date.day, date.month, date.year), (29, 2, 2016))
+        self.assertEqual([d.year for d in dates], [2016, 2016, 1970])
+
+        dates = q.DateColumns.from_bytes(b'11-10-2016 1-2-2017\n3-4-2018\n')
+        self.assertEqual(list(dates.month), [10, 2, 4])
+
+        for invalid in ('29-2-2015', '31-4-2016', '1-13-2016', '0-1-2016',
+                        '300-1-2016', '1-1', '-1-1-2016', '1_0-1-2016',
+                        '1-1-2016x', '1-1-2016-5', '1-1-0', '1--2016',
+                        '1-+1-2016', '1-\u0661-2016'):
+            with self.assertRaises(ValueError):
+                q.NewDate.from_strings([invalid])
+
+        # malformed records are not realigned into valid looking dates
+        for invalid in (b'1-1-2016-5 6-7', b'1-1 2016-2-2-2017', b'1-1-2016 1_0-2-3'):
+            with self.assertRaises(ValueError):
+                q.DateColumns.from_bytes(invalid)
+
+    def test_lazy_attributes(self):
+        """
+        Demo objects are created once, on first access, see questions.py
+        """
+        code = ("import questions as q; cls = q.MyClass; obj = q.mc1; "
+                "assert cls is q.MyClass and isinstance(obj, cls); "
+                "assert q.mc1 is obj and q.nt1 is q.nt1")
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
     def test_metaclass(self):
         """
         See discussion in question.py
@@ -190,6 +365,18 @@ class InterviewTestCase(unittest.TestCase):
         self.assertEqual(q.mc1.X, 1)
         self.assertEqual(q.mc1.Y, 2)
         self.assertEqual(q.mc1.USELESS_METHOD(), (1, 2))
+        self.assertIs(q.mc1.__class__, q.MyClass)
+        self.assertEqual(q.EnoughDocs(1, 2, 3).geta(), 1)
+        self.assertEqual(pickle.loads(pickle.dumps(q.EnoughDocs(1, 2, 3))).geta(), 1)
+
+        # python -O or QUESTIONS_SKIP_VALIDATION env variable turn checks off
+        validate_classes, q.VALIDATE_CLASSES = q.VALIDATE_CLASSES, False
+        try:
+            class NoDocs(object, metaclass=q.DocStrMeta):
+                def start_engine(self):
+                    print("Changing engine")
+        finally:
+            q.VALIDATE_CLASSES = validate_classes
 
         with self.assertRaises(TypeError):
             class NotEnoughDocs(object, metaclass=q.DocStrMeta):
@@ -222,6 +409,100 @@ class InterviewTestCase(unittest.TestCase):
         self.assertEqual(identity(10), 10)
         self.assertEqual(identity(-10), 0)
 
+    def test_batch_decorators(self):
+        import numpy as np
+
+        @q.make_non_negative
+        def identity(x):
+            return x
+
+        self.assertEqual(list(identity(np.array([-2, 0, 3]))), [0, 0, 3])
+
+        draws = q.negative_range_batch(5, 1000, seed=42)
+        self.assertEqual(draws.shape, (1000,))
+        self.assertEqual(draws.min(), 0)
+        self.assertLess(draws.max(), 5)
+        self.assertTrue((draws == q.negative_range_batch(5, 1000, seed=42)).all())
+
+    def test_fused_decorators(self):
+        self.assertEqual(q.factorial(5), 120)
+        self.assertEqual(q.factorial.__name__, 'factorial')
+        for invalid in (0, -1, 2.0, True):
+            with self.assertRaises(ValueError):
+                q.factorial(invalid)
+
+        @q.fused(pre=(lambda x, y: q.check_natural_number(x),),
+                 post=(q.clamp_non_negative,))
+        def sub(x, y):
+            """Subtract"""
+            return x - y
+
+        self.assertEqual(sub(5, 3), 2)
+        self.assertEqual(sub(3, 5), 0)
+        self.assertEqual(sub.__doc__, 'Subtract')
+        with self.assertRaises(ValueError):
+            sub(0, 5)
+
+        @q.fused(post=(q.clamp_non_negative, str))
+        def sub_default(x, y=1):
+            return x - y
+
+        self.assertEqual(sub_default(3), '2')
+        self.assertEqual(sub_default(x=3, y=5), '0')
+
+        # checks are applied on the outer call only
+        calls = []
+
+        @q.fused(pre=(calls.append,))
+        def countdown(n):
+            return n if n == 0 else countdown(n - 1)
+
+        countdown(3)
+        countdown(2)
+        self.assertEqual(calls, [3, 2])
+
+        # a call running in another thread doesn't turn the checks off
+        started, release = threading.Event(), threading.Event()
+
+        @q.fused(pre=(q.check_natural_number,))
+        def slow(n):
+            if n == 1:
+                started.set()
+                release.wait(5)
+            return n
+
+        thread = threading.Thread(target=slow, args=(1,))
+        thread.start()
+        try:
+            started.wait(5)
+            with self.assertRaises(ValueError):
+                slow(-3)
+            with self.assertRaises(ValueError):
+                q.factorial(-1)
+        finally:
+            release.set()
+            thread.join()
+
+        # neither does a re-entrant call from a callback
+        @q.fused(pre=(lambda n, callback: q.check_natural_number(n),))
+        def call_back(n, callback):
+            return callback()
+
+        with self.assertRaises(ValueError):
+            call_back(1, lambda: slow(-3))
+
+        # trusted mode is read on every call
+        trusted, q.TRUSTED_MODE = q.TRUSTED_MODE, True
+        try:
+            self.assertEqual(slow(-3), -3)
+            # and functions decorated in trusted mode aren't wrapped at all
+            self.assertIs(q.fused(pre=(q.check_natural_number,))(q.make_non_negative),
+                          q.make_non_negative)
+        finally:
+            q.TRUSTED_MODE = trusted
+        with self.assertRaises(ValueError):
+            slow(-3)
+
     def test_class_decorator(self):
         pass
 
@@ -261,6 +542,116 @@ class InterviewTestCase(unittest.TestCase):
         self.assertNotIn(d1, q2)
         self.assertNotIn(d2, q2)
 
+    def test_db_conversation(self):
+        u1 = User(name="Ivan")
+        u2 = User(name="Maria")
+        u3 = User(name="Petr")
+        session.add_all([u1, u2, u3])
+        session.commit()
+
+        d1 = Dialogue(receiver=u1, sender=u3)
+        d2 = Dialogue(receiver=u3, sender=u1)
+        d3 = Dialogue(receiver=u2, sender=u1)
+        session.add_all([d1, d2, d3])
+        session.commit()
+
+        # one conversation per unordered pair of users
+        self.assertEqual(d1.conversation_id, d2.conversation_id)
+        self.assertNotEqual(d1.conversation_id, d3.conversation_id)
+        self.assertEqual(d1.conversation.dialogues_count, 2)
+
+        q1 = dialogues_between(u3, u1).all()
+        self.assertIn(d1, q1)
+        self.assertIn(d2, q1)
+        self.assertNotIn(d3, q1)
+
+        self.assertEqual(sorted(p for p, in partners(u1)), sorted([u2.id, u3.id]))
+        self.assertEqual([p for p, in partners(u2)], [u1.id])
+
+        # the conversation is gone along with its last dialogue
+        session.delete(d3)
+        session.commit()
+        self.assertEqual(partners(u2).all(), [])
+        self.assertEqual([p for p, in partners(u1)], [u3.id])
+
+        # changing participants moves the dialogue to another conversation
+        d2.receiver = u2
+        session.commit()
+        session.expire_all()
+        self.assertEqual(d1.conversation.dialogues_count, 1)
+        self.assertEqual(dialogues_between(u1, u2).all(), [d2])
+
+    def test_db_activity(self):
+        u1 = User(name="Sergey")
+        u2 = User(name="Elena")
+        u3 = User(name="Pavel")
+        session.add_all([u1, u2, u3])
+        session.commit()
+
+        dialogues = [Dialogue(sender=u1, receiver=u2),
+                     Dialogue(sender=u1, receiver=u2),
+                     Dialogue(sender=u2, receiver=u1),
+                     Dialogue(sender=u1, receiver=u3)]
+        session.add_all(dialogues)
+        session.commit()
+
+        self.assertEqual(activity(u1), (3, 1))
+        self.assertEqual(activity(u2), (1, 2))
+        self.assertEqual(activity(u3), (0, 1))
+        self.assertEqual(top_partners(u1).all(), [(u2.id, 3), (u3.id, 1)])
+        self.assertEqual(top_partners(u1, limit=1).all(), [(u2.id, 3)])
+
+        session.delete(dialogues[0])
+        dialogues[3].sender = u2
+        session.commit()
+
+        # old participants come from attribute history, no extra SELECT
+        statements = []
+
+        def log_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        self.assertEqual(dialogues[2].sender_id, u2.id)
+        event.listen(engine, 'before_cursor_execute', log_statement)
+        try:
+            dialogues[2].sender_id = u3.id
+            session.flush()
+        finally:
+            event.remove(engine, 'before_cursor_execute', log_statement)
+        self.assertFalse([st for st in statements
+                          if st.startswith('SELECT') and 'FROM dialogues' in st])
+        self.assertEqual(activity(u3), (1, 1))
+        dialogues[2].sender = u2
+        session.commit()
+
+        self.assertEqual(activity(u1), (1, 1))
+        self.assertEqual(activity(u2), (2, 1))
+        self.assertEqual(top_partners(u3).all(), [(u2.id, 1)])
+
+        # backfill gives the same numbers as incremental maintenance
+        before = {u.id: activity(u) for u in (u1, u2, u3)}
+        partners_before = top_partners(u2).all()
+        rebuild_aggregates()
+        session.expire_all()
+        self.assertEqual({u.id: activity(u) for u in (u1, u2, u3)}, before)
+        self.assertEqual(top_partners(u2).all(), partners_before)
+        self.assertEqual(dialogues_between(u1, u2).all(), dialogues[1:3])
+
+    def test_deep_sizeof_orm(self):
+        u1 = User(name="Anna")
+        u2 = User(name="Ivan")
+        session.add_all([Dialogue(sender=u1, receiver=u2),
+                         Dialogue(sender=u2, receiver=u1)])
+        session.commit()
+
+        loaded = dialogues_between(u1, u2).all()
+        # ORM state is ignored, the session and mappers are not counted
+        sizes = memory.deep_sizeof_by_type(loaded)
+        for name in ('InstanceState', 'Session', 'Mapper', 'Engine'):
+            self.assertNotIn(name, sizes)
+        self.assertIn('Dialogue', sizes)
+        self.assertEqual(sum(sizes.values()), memory.deep_sizeof(loaded))
+
     def test_class_based_decorators(self):
         @q.DecoratorClass(q.CustomException)
         def mult(a, b):
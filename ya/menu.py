@@ -3,7 +3,13 @@
 import random
 import bisect
 import itertools
+import struct
 import sys
+from collections import namedtuple
+from functools import lru_cache
+from statistics import NormalDist
+
+import numpy as np
 
 ### Constants
 MAINS = {'chicken': 0.3, 'beef': 0.3, 'fish': 0.25, 'pork': 0.15}
@@ -31,21 +37,57 @@ PLATE =  """
 """
 
 class Menu(object):
-    """Menu consists of a main course, side dish and a snack."""
+    """Menu consists of a main course, side dish and a snack.
 
-    def __init__(self, main, staple, snack):
-        self.main = main
-        self.staple = staple
-        self.snack = snack
+    Menus are immutable flyweights: there is only one instance per
+    (main, staple, snack) triple, so Menu(...) allocates nothing once the
+    triple has been seen, and menus are cheap to hash, compare and count.
+    """
+    __slots__ = ('main', 'staple', 'snack', '_digestable')
+    _instances = {}
 
-    def is_digestable(self):
-        """Return True if all dishes satisfy certain compatibility rules.
-        """
+    def __new__(cls, main, staple, snack):
+        key = (cls, main, staple, snack)
+        try:
+            return cls._instances[key]
+        except KeyError:
+            pass
+        self = super(Menu, cls).__new__(cls)
+        object.__setattr__(self, 'main', main)
+        object.__setattr__(self, 'staple', staple)
+        object.__setattr__(self, 'snack', snack)
+        object.__setattr__(self, '_digestable', self._check_digestable())
+        return cls._instances.setdefault(key, self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Menu is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Menu is immutable")
+
+    def __reduce__(self):
+        return self.__class__, (self.main, self.staple, self.snack)
+
+    def __eq__(self, other):
+        if not isinstance(other, Menu):
+            return NotImplemented
+        return ((self.main, self.staple, self.snack)
+                == (other.main, other.staple, other.snack))
+
+    def __hash__(self):
+        return hash((self.main, self.staple, self.snack))
+
+    def _check_digestable(self):
         return not ((self.main == 'fish' and self.staple == 'pasta')
                     or (self.staple == 'pasta' and self.snack == 'bread')
                     or (self.main == 'pork' and self.staple == 'potato'
                         and self.snack != 'none'))
 
+    def is_digestable(self):
+        """Return True if all dishes satisfy certain compatibility rules.
+        """
+        return self._digestable
+
     def __repr__(self):
         return """{0} | {1} | {2}""".format(self.main, self.staple, self.snack)
 
@@ -109,6 +151,273 @@ def generate_menu2(days: int) -> [Menu]:
 
     return menu_list
 
+### Sequential planning
+WEEK = 7
+WEEKLY_LIMITS = {'fish': 2}
+
+def alias_table(weights: [float]) -> ([float], [int]):
+    """Return Vose's alias method tables for weights given.
+
+    Pick i uniformly, then keep it with probability prob[i],
+    or take alias[i] otherwise: O(1) per sample.
+    """
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, w in enumerate(scaled) if w < 1]
+    large = [i for i, w in enumerate(scaled) if w >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+    return prob, alias
+
+class MenuChain(object):
+    """Markov chain over digestible menus with cross-day constraints.
+
+    State of the chain is a main course of the previous day and a bit mask
+    of the previous WEEK - 1 days for every main course limited per week.
+    Digestibility and constraints are compiled into an alias table and
+    a next state table for every reachable state, so a day is sampled
+    in O(1) with no rejections and no backtracking.
+    """
+
+    def __init__(self, repeat_main: bool=False,
+                 weekly_limits: {str: int}=None):
+        weekly_limits = weekly_limits or {}
+        unknown = set(weekly_limits) - set(MAINS)
+        if unknown:
+            raise ValueError("Unknown main courses: {0}".format(
+                ", ".join(sorted(unknown))))
+        self.menus = [Menu(*m) for m in
+                      itertools.product(MAINS, STAPLES, SNACKS)]
+        weights = [MAINS[m.main] * STAPLES[m.staple] * SNACKS[m.snack]
+                   if m.is_digestable() else 0 for m in self.menus]
+        history = (1 << (WEEK - 1)) - 1
+
+        start = (None, (0,) * len(weekly_limits))
+        states = [start]
+        index = {start: 0}
+        self.tables = []
+        self.next = []
+        for last, masks in states:
+            allowed = [w if (repeat_main or m.main != last)
+                       and all(m.main != main or bin(mask).count('1') < limit
+                               for (main, limit), mask
+                               in zip(weekly_limits.items(), masks))
+                       else 0 for m, w in zip(self.menus, weights)]
+            if not any(allowed):
+                raise ValueError("Constraints leave no menu to choose from")
+            self.tables.append(alias_table(allowed))
+
+            next_states = []
+            for m, w in zip(self.menus, allowed):
+                state = (m.main, tuple(((mask << 1) | (m.main == main)) & history
+                                       for main, mask in zip(weekly_limits, masks)))
+                if w and state not in index:
+                    index[state] = len(states)
+                    states.append(state)
+                next_states.append(index.get(state))
+            self.next.append(next_states)
+
+    def plan(self, days: int) -> [Menu]:
+        """Return list of Menu for number of days specified."""
+        menus, tables, next_states = self.menus, self.tables, self.next
+        n = len(menus)
+        rand = random.random
+        state = 0
+        menu_list = []
+        for _ in range(days):
+            prob, alias = tables[state]
+            i = int(rand() * n)
+            if rand() >= prob[i]:
+                i = alias[i]
+            menu_list.append(menus[i])
+            state = next_states[state][i]
+        return menu_list
+
+@lru_cache()
+def _menu_chain(repeat_main: bool, weekly_limits: ((str, int),)) -> MenuChain:
+    return MenuChain(repeat_main, dict(weekly_limits))
+
+def generate_menu3(days: int, repeat_main: bool=False,
+                   weekly_limits: {str: int}=None) -> [Menu]:
+    """Return list of Menu for number of days specified.
+
+    Unlike generate_menu2 takes constraints across days into account:
+    by default the same main course is never served two days in a row
+    and fish is served at most twice a week (see WEEKLY_LIMITS). Dishes follow MAINS, STAPLES
+    and SNACKS weights (not quotas) and the chain is compiled once
+    per set of constraints.
+    """
+    if weekly_limits is None:
+        weekly_limits = WEEKLY_LIMITS
+    chain = _menu_chain(repeat_main, tuple(sorted(weekly_limits.items())))
+    return chain.plan(days)
+
+### Monte Carlo statistics
+# Dishes get encoded with their index in the constants dicts above,
+# so that many plans can be simulated at once with NumPy arrays
+MAIN_NAMES = tuple(MAINS)
+STAPLE_NAMES = tuple(STAPLES)
+SNACK_NAMES = tuple(SNACKS)
+
+# Menu.is_digestable rules, one per line
+RULES = ('fish with pasta', 'pasta with bread', 'pork with potato and snack')
+
+CourseStats = namedtuple('CourseStats', [
+    'names',      # dish names
+    'quota',      # dish quotas as in generate_menu2, shape (dishes,)
+    'counts',     # dish counts per plan, shape (plans, dishes)
+    'histogram',  # plans with given dish count, shape (dishes, days + 1)
+    'mean',       # mean dish frequency, shape (dishes,)
+    'ci',         # confidence interval of the mean, shape (2, dishes)
+    'deviation',  # RMS deviation of counts from quota, shape (dishes,)
+])
+
+Simulation = namedtuple('Simulation', [
+    'mains', 'staples', 'snacks',  # CourseStats
+    'rejections',      # rejected menus per rule, shape (len(RULES),)
+    'rejection_rate',  # share of rejected menus among all the drawn ones
+])
+
+def rule_violations(mains: np.ndarray, staples: np.ndarray,
+                    snacks: np.ndarray) -> np.ndarray:
+    """Return boolean array of shape (..., len(RULES)) of violated rules.
+
+    Vectorized counterpart of Menu.is_digestable for encoded dishes.
+    """
+    pasta = staples == STAPLE_NAMES.index('pasta')
+    return np.stack([
+        (mains == MAIN_NAMES.index('fish')) & pasta,
+        pasta & (snacks == SNACK_NAMES.index('bread')),
+        ((mains == MAIN_NAMES.index('pork'))
+         & (staples == STAPLE_NAMES.index('potato'))
+         & (snacks != SNACK_NAMES.index('none'))),
+    ], axis=-1)
+
+def quota(weights: {str: float}, days: int) -> np.ndarray:
+    """Return dish counts of generate_menu2 distribution lists."""
+    return np.array([round(weights[n] * days) for n in weights])
+
+def _course_stats(names, course_quota, dishes, taken, days, z) -> CourseStats:
+    plans, n = len(dishes), len(names)
+    keys = np.arange(plans)[:, None] * n + dishes
+    counts = np.bincount(keys[taken], minlength=plans * n).reshape(plans, n)
+    histogram = np.stack([np.bincount(c, minlength=days + 1)
+                          for c in counts.T])
+    freqs = counts / days
+    mean = freqs.mean(axis=0)
+    error = z * freqs.std(axis=0, ddof=1) / np.sqrt(plans)
+    return CourseStats(names, course_quota, counts, histogram, mean,
+                       np.stack([mean - error, mean + error]),
+                       np.sqrt(((counts - course_quota) ** 2).mean(axis=0)))
+
+def simulate_menu(plans: int, days: int, confidence: float=0.95,
+                  seed: int=None) -> Simulation:
+    """Simulate number of generate_menu2 plans for number of days specified.
+
+    All plans are drawn at once as (plans, candidates) arrays of encoded
+    dishes, where candidates is a number of menus expected to be enough
+    for days digestible ones (more get drawn if not).
+
+    days >= 2, plans >= 2 (confidence intervals need a sample variance)
+    """
+    if plans < 2:
+        raise ValueError("At least 2 plans are needed for statistics")
+    if days < 2:
+        raise ValueError("At least 2 days are needed for dish quotas")
+    rng = np.random.default_rng(seed)
+    quotas = [quota(MAINS, days), quota(STAPLES, days), quota(SNACKS, days)]
+    probs = [q / q.sum() for q in quotas]
+
+    # acceptance probability over all the 80 possible menus
+    grid = np.meshgrid(*[np.arange(len(p)) for p in probs], indexing='ij')
+    accept = (np.einsum('i,j,k->ijk', *probs)
+              * ~rule_violations(*grid).any(axis=-1)).sum()
+    chunk = int(days / accept * 1.1) + 16
+
+    draws = [np.empty((plans, 0), dtype=np.int8) for _ in probs]
+    accepted = np.empty((plans, 0), dtype=bool)
+    while accepted.shape[1] == 0 or accepted.sum(axis=1).min() < days:
+        new = [rng.choice(len(p), size=(plans, chunk), p=p).astype(np.int8)
+               for p in probs]
+        draws = [np.hstack([d, n]) for d, n in zip(draws, new)]
+        accepted = np.hstack([accepted,
+                              ~rule_violations(*new).any(axis=-1)])
+
+    # candidates drawn until days menus are accepted, as generate_menu2 does
+    considered = (np.cumsum(accepted, axis=1) - accepted) < days
+    taken = accepted & considered
+    violations = rule_violations(*draws) & considered[..., None]
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    courses = [_course_stats(names, q, d, taken, days, z)
+               for names, q, d in zip((MAIN_NAMES, STAPLE_NAMES, SNACK_NAMES),
+                                      quotas, draws)]
+    rejected = (considered & ~accepted).sum()
+    return Simulation(*courses, violations.sum(axis=(0, 1)),
+                      rejected / considered.sum())
+
+### Binary plan storage
+# File layout (little-endian):
+#   header:  magic b'MENU', version (u16), vocabulary size in bytes (u16),
+#            number of sites (u32), number of days (u32)
+#   vocabulary: UTF-8 text, a line per course (mains, staples, snacks),
+#            dish names separated by commas
+#   data:    a (main, staple, snack) triple of u8 dish indices
+#            per day per site, day-major, i.e. days x sites x 3 array
+PLAN_MAGIC = b'MENU'
+PLAN_VERSION = 1
+PLAN_HEADER = struct.Struct('<4sHHII')
+
+class PlanArchive(object):
+    """Memory-mapped plans of a number of sites, see save_plans."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header = f.read(PLAN_HEADER.size)
+            magic, version, vocab_size, sites, days = PLAN_HEADER.unpack(header)
+            if magic != PLAN_MAGIC or version != PLAN_VERSION:
+                raise ValueError("{0} is not a plan archive".format(path))
+            vocab = f.read(vocab_size).decode('utf-8')
+        self.names = tuple(tuple(line.split(','))
+                           for line in vocab.split('\n'))
+        self.sites = sites
+        self.days = days
+        self.data = np.memmap(path, dtype=np.uint8, mode='r',
+                              offset=PLAN_HEADER.size + vocab_size,
+                              shape=(days, sites, 3))
+
+    def __len__(self):
+        return self.days
+
+    def menu(self, day: int, site: int=0) -> Menu:
+        """Return Menu served on the day (counting from 0) at the site."""
+        return Menu(*(names[i] for names, i
+                      in zip(self.names, self.data[day, site])))
+
+def encode_plan(plan: [Menu]) -> np.ndarray:
+    """Return (days, 3) array of dish indices for the plan."""
+    indices = [{n: i for i, n in enumerate(names)}
+               for names in (MAIN_NAMES, STAPLE_NAMES, SNACK_NAMES)]
+    return np.array([(indices[0][m.main], indices[1][m.staple],
+                      indices[2][m.snack]) for m in plan], dtype=np.uint8)
+
+def save_plans(path: str, plans: [[Menu]]) -> None:
+    """Write plans of the same number of days, a plan per site."""
+    data = np.stack([encode_plan(plan) for plan in plans], axis=1)
+    vocab = '\n'.join(','.join(names) for names
+                      in (MAIN_NAMES, STAPLE_NAMES, SNACK_NAMES)).encode('utf-8')
+    days, sites = data.shape[:2]
+    with open(path, 'wb') as f:
+        f.write(PLAN_HEADER.pack(PLAN_MAGIC, PLAN_VERSION, len(vocab),
+                                 sites, days))
+        f.write(vocab)
+        data.tofile(f)
+
 if __name__ == '__main__':
     args = sys.argv[1:]
     try:
@@ -0,0 +1,164 @@
+import copy
+import os
+import pickle
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import menu
+
+
+class MenuTestCase(unittest.TestCase):
+    def test_simulate_menu(self):
+        days = 30
+        result = menu.simulate_menu(200, days, seed=1)
+
+        for course, weights in ((result.mains, menu.MAINS),
+                                (result.staples, menu.STAPLES),
+                                (result.snacks, menu.SNACKS)):
+            self.assertEqual(course.names, tuple(weights))
+            self.assertEqual(course.counts.shape, (200, len(weights)))
+            # every plan has exactly days menus
+            self.assertTrue((course.counts.sum(axis=1) == days).all())
+            self.assertEqual(course.histogram.shape, (len(weights), days + 1))
+            self.assertTrue((course.histogram.sum(axis=1) == 200).all())
+            self.assertTrue((course.ci[0] <= course.mean).all())
+            self.assertTrue((course.mean <= course.ci[1]).all())
+            self.assertAlmostEqual(course.mean.sum(), 1)
+
+        self.assertEqual(result.rejections.shape, (len(menu.RULES),))
+        self.assertTrue(0 <= result.rejection_rate < 1)
+
+        same = menu.simulate_menu(200, days, seed=1)
+        self.assertTrue((same.mains.counts == result.mains.counts).all())
+
+        with self.assertRaises(ValueError):
+            menu.simulate_menu(1, days)
+        with self.assertRaises(ValueError):
+            menu.simulate_menu(200, 1)
+
+    def test_course_stats(self):
+        # 2 plans of 2 days: (a, a) and (a, b), quota is one a and one b
+        dishes = np.array([[0, 0], [0, 1]])
+        stats = menu._course_stats(('a', 'b'), np.array([1, 1]), dishes,
+                                   np.ones((2, 2), dtype=bool), 2, 1.96)
+        self.assertEqual(stats.counts.tolist(), [[2, 0], [1, 1]])
+        self.assertEqual(stats.mean.tolist(), [0.75, 0.25])
+        # deviations from quota are (1, 0) for a and (-1, 0) for b
+        self.assertTrue(np.allclose(stats.deviation, [0.5 ** 0.5, 0.5 ** 0.5]))
+
+        # a biased plan deviates from quota even with no variance
+        stats = menu._course_stats(('a', 'b'), np.array([1, 1]), dishes[:1].repeat(2, axis=0),
+                                   np.ones((2, 2), dtype=bool), 2, 1.96)
+        self.assertEqual(stats.deviation.tolist(), [1, 1])
+
+    def test_rule_violations(self):
+        for i, main in enumerate(menu.MAIN_NAMES):
+            for j, staple in enumerate(menu.STAPLE_NAMES):
+                for k, snack in enumerate(menu.SNACK_NAMES):
+                    violations = menu.rule_violations(np.array(i), np.array(j), np.array(k))
+                    self.assertEqual(violations.any(),
+                                     not menu.Menu(main, staple, snack).is_digestable())
+
+
+    def test_plan_archive(self):
+        plans = [menu.generate_menu2(20) for _ in range(3)]
+        # make sites tell apart on the first day regardless of random
+        plans[0][0] = menu.Menu('chicken', 'rice', 'bread')
+        plans[1][0] = menu.Menu('beef', 'vegs', 'none')
+        plans[2][0] = menu.Menu('pork', 'buckwheat', 'cheese')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'plans.bin')
+            menu.save_plans(path, plans)
+            archive = menu.PlanArchive(path)
+
+            self.assertEqual(len(archive), 20)
+            self.assertEqual(archive.sites, 3)
+            self.assertEqual(archive.names, (menu.MAIN_NAMES, menu.STAPLE_NAMES,
+                                             menu.SNACK_NAMES))
+            for site, plan in enumerate(plans):
+                for day, expected in enumerate(plan):
+                    self.assertEqual(archive.menu(day, site), expected)
+
+            # data is day-major: days x sites x 3
+            self.assertEqual(archive.data.shape, (20, 3, 3))
+            self.assertEqual(list(archive.data[0, 1]), [1, 4, 3])
+            header_size = os.path.getsize(path) - 20 * 3 * 3
+            with open(path, 'rb') as f:
+                f.seek(header_size + 3)
+                self.assertEqual(list(f.read(3)), [1, 4, 3])
+            del archive
+
+            with open(path, 'r+b') as f:
+                f.write(b'MUNE')
+            with self.assertRaises(ValueError):
+                menu.PlanArchive(path)
+
+            with open(path, 'r+b') as f:
+                f.write(struct.pack('<4sH', menu.PLAN_MAGIC, menu.PLAN_VERSION + 1))
+            with self.assertRaises(ValueError):
+                menu.PlanArchive(path)
+
+
+    def test_generate_menu3(self):
+        plan = menu.generate_menu3(3 * 365)
+        self.assertEqual(len(plan), 3 * 365)
+        self.assertTrue(all(m.is_digestable() for m in plan))
+        for today, tomorrow in zip(plan, plan[1:]):
+            self.assertNotEqual(today.main, tomorrow.main)
+        for day in range(len(plan)):
+            week = plan[day:day + menu.WEEK]
+            self.assertLessEqual(sum(m.main == 'fish' for m in week),
+                                 menu.WEEKLY_LIMITS['fish'])
+
+        plan = menu.generate_menu3(365, repeat_main=True,
+                                   weekly_limits={'fish': 0, 'pork': 1})
+        self.assertNotIn('fish', [m.main for m in plan])
+        for day in range(len(plan)):
+            week = plan[day:day + menu.WEEK]
+            self.assertLessEqual(sum(m.main == 'pork' for m in week), 1)
+
+    def test_menu_chain_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            menu.MenuChain(weekly_limits={'fsh': 2})
+        # nothing left to serve
+        with self.assertRaises(ValueError):
+            menu.MenuChain(weekly_limits={main: 0 for main in menu.MAINS})
+        # pork only, but it can't be served two days in a row
+        with self.assertRaises(ValueError):
+            menu.MenuChain(weekly_limits={'chicken': 0, 'beef': 0, 'fish': 0})
+
+
+    def test_menu_flyweight(self):
+        first = menu.Menu('fish', 'rice', 'none')
+        self.assertIs(menu.Menu('fish', 'rice', 'none'), first)
+        self.assertEqual(first, menu.Menu('fish', 'rice', 'none'))
+        self.assertNotEqual(first, menu.Menu('fish', 'rice', 'bread'))
+        self.assertEqual(hash(first), hash(('fish', 'rice', 'none')))
+        self.assertIs(pickle.loads(pickle.dumps(first)), first)
+        self.assertIs(copy.deepcopy(first), first)
+
+        with self.assertRaises(AttributeError):
+            first.main = 'beef'
+        with self.assertRaises(AttributeError):
+            first.price = 10
+        with self.assertRaises(AttributeError):
+            del first.main
+        self.assertEqual(menu.Menu('fish', 'rice', 'none').main, 'fish')
+        self.assertFalse(hasattr(first, '__dict__'))
+
+        self.assertFalse(menu.Menu('fish', 'pasta', 'none').is_digestable())
+        self.assertTrue(first.is_digestable())
+
+        # a plan shares instances, at most one per (main, staple, snack)
+        plan = menu.generate_menu2(365)
+        self.assertLessEqual(len({id(m) for m in plan}),
+                             len(menu.MAINS) * len(menu.STAPLES) * len(menu.SNACKS))
+        self.assertEqual(len({id(m) for m in plan}), len(set(plan)))
+
+
+if __name__ == '__main__':
+    unittest.main()